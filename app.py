@@ -1,13 +1,24 @@
 import os
 import re
+import argparse
 import csv
+import json
+import zlib
+import struct
 import base64
-from typing import Tuple
+import sqlite3
+import hashlib
+import asyncio
+import random
+import functools
+import itertools
+from typing import List, Optional, Tuple
+from collections import namedtuple
 from io import BytesIO
 from PIL import Image
-from PIL.PngImagePlugin import PngInfo
-from openai import OpenAI
+from openai import AsyncOpenAI, APIConnectionError, APITimeoutError, RateLimitError
 from dotenv import load_dotenv
+from utils.CountPngs import calculate_tokens_per_image, determine_tiles, scale_for_vision
 import time
 from datetime import datetime
 
@@ -15,111 +26,447 @@ from datetime import datetime
 load_dotenv()
 
 # Set up OpenAI client
-client = OpenAI()
+# The SDK's own retries are turned off, retry_openai below does it with backoff + jitter
+client = AsyncOpenAI(max_retries=0)
 
+# How many requests are in flight at once (the API workers)
+MAX_CONCURRENCY = 8
+
+# Your account's rate limits for gpt-4o-mini, check https://platform.openai.com/settings/organization/limits
+# and set these to your tier. Requests are held back until they fit under both.
+MAX_REQUESTS_PER_MINUTE = 500
+MAX_TOKENS_PER_MINUTE = 200_000
+
+# How many screenshots get packed into one vision request.
+# Keep it at 8 or below so all the answers fit in the MAX_COMPLETION_TOKENS budget.
+BATCH_SIZE = 4
+MAX_COMPLETION_TOKENS = 3000
+
+# Workers for the other pipeline stages in process_screenshots.
+# Encoding is Pillow + base64 work in threads, writing is the metadata + rename.
+ENCODE_WORKERS = min(8, os.cpu_count() or 4)
+WRITE_WORKERS = 4
+
+# Descriptions of screenshots we've already paid for, keyed by the sha256 of the file.
+# Byte-identical copies and retakes reuse the answer instead of going back to OpenAI,
+# and an interrupted run picks up where it left off.
+# Set SCREENSHOT_HOLMES_CACHE (e.g. in .env) to keep it somewhere else, or run with --no-cache to skip it.
+CACHE_PATH = os.path.expanduser(os.getenv("SCREENSHOT_HOLMES_CACHE", "~/.screenshot_holmes_cache.db"))
+# sqlite3 keeps this one in memory, so nothing is looked up from or saved for later runs
+NO_CACHE_PATH = ":memory:"
+
+# How often to check on a job submitted with --batch (OpenAI Batch API)
+BATCH_POLL_INTERVAL = 60  # seconds
+BATCH_DONE_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+class RateLimiter:
+    """
+    Proactive throttling on both requests and tokens per minute, instead of firing
+    everything and backing off on 429s. Same idea as the OpenAI cookbook's api_request_parallel_processor.py:
+    both capacities refill continuously at max_per_minute / 60 every second, and a request only goes
+    out once there's room for it in both. Waiters are served in order.
+    """
+    def __init__(self, max_requests_per_minute: int, max_tokens_per_minute: int):
+        self.max_requests_per_minute = max_requests_per_minute
+        self.max_tokens_per_minute = max_tokens_per_minute
+        self.available_request_capacity = max_requests_per_minute
+        self.available_token_capacity = max_tokens_per_minute
+        self._last_update = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _replenish(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._last_update
+        self._last_update = now
+        self.available_request_capacity = min(
+            self.max_requests_per_minute,
+            self.available_request_capacity + elapsed * self.max_requests_per_minute / 60
+        )
+        self.available_token_capacity = min(
+            self.max_tokens_per_minute,
+            self.available_token_capacity + elapsed * self.max_tokens_per_minute / 60
+        )
+
+    async def wait(self, tokens: int) -> None:
+        # A request bigger than the whole bucket would never fit, so it just waits for a full bucket
+        tokens = min(tokens, self.max_tokens_per_minute)
+        async with self._lock:
+            while True:
+                self._replenish()
+                if self.available_request_capacity >= 1 and self.available_token_capacity >= tokens:
+                    self.available_request_capacity -= 1
+                    self.available_token_capacity -= tokens
+                    return
+                request_wait = (1 - self.available_request_capacity) * 60 / self.max_requests_per_minute
+                token_wait = (tokens - self.available_token_capacity) * 60 / self.max_tokens_per_minute
+                await asyncio.sleep(max(request_wait, token_wait, 0.01))
+
+
+limiter = RateLimiter(MAX_REQUESTS_PER_MINUTE, MAX_TOKENS_PER_MINUTE)
+
+class DescriptionCache:
+    """
+    Small sqlite3 store of sha256 -> (description, filename).
+    Lookups are a primary key hit in a local file, so it's used straight from the event loop.
+    """
+    def __init__(self, path: str = CACHE_PATH):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS descriptions (sha256 TEXT PRIMARY KEY, description TEXT, filename TEXT)"
+        )
+
+    def get(self, sha256: str) -> Optional[dict]:
+        row = self.connection.execute(
+            "SELECT description, filename FROM descriptions WHERE sha256 = ?", (sha256,)
+        ).fetchone()
+        if row is None:
+            return None
+        # Nothing was sent to OpenAI for a cache hit, so it didn't cost any tokens
+        return {'description': row[0], 'filename': row[1], 'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+
+    def put(self, sha256: str, result: dict) -> None:
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO descriptions (sha256, description, filename) VALUES (?, ?, ?)",
+                (sha256, result['description'], result['filename'])
+            )
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+# Retry settings for transient OpenAI failures (throttling, 5xx, network blips)
+RETRY_ATTEMPTS = 5
+RETRY_BASE_DELAY = 1  # seconds
+RETRY_MAX_DELAY = 30  # seconds
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Decide if an OpenAI error is worth retrying.
+    Rate limits, timeouts, connection errors and 5xx are; bad requests and auth errors are not.
+    """
+    if isinstance(error, (RateLimitError, APITimeoutError, APIConnectionError)):
+        return True
+    if getattr(error, "status_code", None) in RETRYABLE_STATUS_CODES:
+        return True
+    return re.search(r"rate limit|quota", str(error), re.IGNORECASE) is not None
+
+
+def retry_openai(func):
+    """
+    Retry an async OpenAI call with exponential backoff plus jitter.
+    Sleeps base * 2**attempt (capped) + a random second, and gives up after RETRY_ATTEMPTS tries.
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        for attempt in range(RETRY_ATTEMPTS):
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                if attempt == RETRY_ATTEMPTS - 1 or not is_retryable(e):
+                    raise
+                delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt) + random.uniform(0, 1)
+                print(f"OpenAI call failed ({str(e)}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+    return wrapper
+
+
+@retry_openai
+async def create_chat_completion(estimated_tokens: int, **kwargs):
+    """
+    Single place every OpenAI chat call goes through, so each attempt is rate limited and retried.
+    estimated_tokens is what the limiter charges against the tokens per minute budget.
+    """
+    await limiter.wait(estimated_tokens)
+    return await client.chat.completions.create(**kwargs)
+
+
+def read_screenshot(image_path: str) -> Tuple[bytes, str]:
+    """
+    Read the screenshot's bytes along with their sha256, the key for the description cache.
+    The hash is taken from the bytes already in memory, so the file is only read once.
+    """
+    with open(image_path, 'rb') as image_file:
+        png_data = image_file.read()
+    return png_data, hashlib.sha256(png_data).hexdigest()
+
+def png_dimensions(png_data: bytes) -> Tuple[int, int]:
+    """
+    Width and height straight from the IHDR chunk, which always comes right after the signature.
+    Raises ValueError for anything that isn't a PNG, so a misnamed file never gets sent to the API.
+    """
+    if len(png_data) < 24 or not png_data.startswith(PNG_SIGNATURE) or png_data[12:16] != b'IHDR':
+        raise ValueError("not a PNG file")
+    return struct.unpack(">II", png_data[16:24])
+
+def flatten_to_rgb(img: Image.Image) -> Image.Image:
+    """
+    JPEG has no alpha, and a plain convert("RGB") turns transparent pixels black.
+    Anything with transparency (an alpha channel or a tRNS chunk) is laid over white instead.
+    """
+    if img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info:
+        rgba = img.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+    return img.convert("RGB")
 
 '''
-This encodes the image in base64 to send to openai api
+This reads the screenshot once and encodes it in base64 to send to openai api
 Also check if a the user wants to save tokens and will cut the image in half
 We could make it a feature flag on the size to cut. 
+When the image isn't resized the file is already a PNG, so the raw bytes are sent
+as-is instead of decoding and re-encoding the whole image with Pillow.
+A resized copy is already lossy, so it goes up as a JPEG which is several times smaller than the PNG.
+The raw PNG bytes are handed back too, so finalize_with_metadata can write the tagged
+file from them later without opening the screenshot a second time.
+Returns a PreparedImage: the data URL ready to drop into the request, the original PNG bytes,
+and the size of the image that's actually sent (for estimating its tokens).
 '''
-def encode_image(image_path: str, resize: bool = False) -> str:
-    with Image.open(image_path) as img:
-        original_width, original_height = img.size
-        if resize:
+PreparedImage = namedtuple('PreparedImage', ['image_url', 'png_data', 'width', 'height'])
+
+def prepare_image(image_path: str, resize: bool = False, png_data: Optional[bytes] = None) -> PreparedImage:
+    if png_data is None:
+        png_data, _ = read_screenshot(image_path)
+    # The width and height are the first two fields of the IHDR chunk, no need to decode anything
+    width, height = png_dimensions(png_data)
+
+    if resize:
+        with Image.open(BytesIO(png_data)) as img:
+            original_width, original_height = img.size
             # Check if both dimensions will be at least 512 after resizing
             if original_width * 0.5 >= 512 and original_height * 0.5 >= 512:
                 new_width = int(original_width * 0.5)
                 new_height = int(original_height * 0.5)
-                img = img.resize((new_width, new_height), Image.LANCZOS)
-                print(f"Resized image for API: {image_path} from {original_width}x{original_height} to {new_width}x{new_height}")
-            else:
-                print(f"Image not resized for API: {image_path} (one or both dimensions would be below 512 pixels)")
-        
-        # Save the image to a BytesIO object
-        buffered = BytesIO()
-        img.save(buffered, format="PNG")
-    
-    return base64.b64encode(buffered.getvalue()).decode('utf-8')
+                # With reducing_gap=1.0 a 2x shrink is done entirely by a quick reduce(2) (a 2x2 box average),
+                # LANCZOS is only left to trim the extra pixel off an odd dimension.
+                # A gap of 2.0 or more would skip reduce() at exactly half size and run the full LANCZOS pass.
+                try:
+                    img.thumbnail((new_width, new_height), Image.Resampling.LANCZOS, reducing_gap=1.0)
+                except ValueError:
+                    # reduce() doesn't take every mode a PNG can open in (16-bit grayscale is "I;16"),
+                    # those get the plain LANCZOS resize instead
+                    img.thumbnail((new_width, new_height), Image.Resampling.LANCZOS, reducing_gap=None)
+                print(f"Resized image for API: {image_path} from {original_width}x{original_height} to {img.width}x{img.height}")
 
-def get_image_content(image_path: str, resize: bool = False) -> Tuple[str, dict]:
-    
+                # Save the image to a BytesIO object
+                buffered = BytesIO()
+                flatten_to_rgb(img).save(buffered, format="JPEG", quality=85, optimize=False)
+                # getbuffer() is a view of the JPEG bytes, so they aren't copied again before encoding
+                image_url = f"data:image/jpeg;base64,{base64.b64encode(buffered.getbuffer()).decode('ascii')}"
+                return PreparedImage(image_url, png_data, img.width, img.height)
+
+            print(f"Image not resized for API: {image_path} (one or both dimensions would be below 512 pixels)")
+
+    image_url = f"data:image/png;base64,{base64.b64encode(png_data).decode('ascii')}"
+    return PreparedImage(image_url, png_data, width, height)
+
+def encode_image(image_path: str, resize: bool = False) -> str:
+    """
+    Just the data URL, for when the file gets written back much later (--batch).
+    """
+    return prepare_image(image_path, resize).image_url
+
+SYSTEM_PROMPT = (
+    "You are an AI assistant specialized in analyzing screenshots and generating "
+    "descriptive filenames for archival purposes. Your task is to examine each provided image, describe its "
+    "content concisely and generate a descriptive filename to easily understand whats in the file "
+    "when quickly scrolling through folders. "
+    "Return strict JSON of the form {\"images\": [{\"index\": ..., \"description\": ..., \"filename\": ...}]} "
+    "with one entry per image, where description is <=200 chars and filename is snake_case with no extension."
+)
+
+
+def build_messages(image_urls: List[str]) -> list:
+    """
+    Build the chat messages for one vision request holding one or more images.
+    Each image is preceded by its index so the answers can be matched back up.
     """
-    Use OpenAI's vision capabilities to extract content from the image.
+    count = len(image_urls)
+    content = [
+        {
+            "type": "text",
+            "text": (
+                f"Analyze these {count} images and, for each image i, provide: "
+                f"1) A concise description of its content 2) A concise filename. "
+                f"Return one entry per image, indexed 0..{count - 1}."
+            )
+        }
+    ]
+    for index, image_url in enumerate(image_urls):
+        content.append({"type": "text", "text": f"Image {index}:"})
+        content.append({
+            "type": "image_url",
+            "image_url": {
+                "url": image_url
+            }
+        })
+
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": content}
+    ]
+
+
+def parse_batch_response(message_content: str, count: int) -> List[Optional[dict]]:
+    """
+    Turn the model's JSON answer into a list lined up with the images that were sent.
+    An image the model skipped (or gave a bad filename for) comes back as None.
+    """
+    entries = json.loads(message_content).get("images", [])
+    results = [None] * count
+    for entry in entries:
+        index = entry.get("index")
+        if not isinstance(index, int) or not 0 <= index < count:
+            continue
+        try:
+            results[index] = {
+                'description': entry["description"].strip(),
+                'filename': sanitize_filename(entry["filename"])
+            }
+        except (KeyError, AttributeError, ValueError) as e:
+            print(f"Skipping bad entry for image {index}: {str(e)}")
+    return results
+
+
+def estimate_request_tokens(images: List[PreparedImage]) -> int:
+    """
+    Rough token count for one vision request, using the same tile math as utils/CountPngs.py.
+    Each image is tiled at the size OpenAI scales it down to, not the size it's sent at.
+    The completion budget counts too, that's how OpenAI charges the request against your TPM limit.
+    """
+    image_tokens = sum(
+        calculate_tokens_per_image(determine_tiles(*scale_for_vision(image.width, image.height)))
+        for image in images
+    )
+    return image_tokens + MAX_COMPLETION_TOKENS
+
+
+async def get_batch_content(images: List[PreparedImage]) -> List[Optional[dict]]:
+    """
+    Use OpenAI's vision capabilities to extract content from a batch of images in one request.
     Only using the 4o-mini vision, but you can try whatever model you want.
     There is some speculation Openai is using the same model either way
     Read more here: https://platform.openai.com/docs/guides/vision
 
+    Takes the images from prepare_image. The descriptions and new filenames come back
+    together as JSON, so a batch of BATCH_SIZE screenshots only costs one request.
+    The token usage is split evenly across the images in the batch.
+    You can tweak SYSTEM_PROMPT to get a more specific or different tone of filename.
     """
-    base64_image = encode_image(image_path, resize)
-    
-    response = client.chat.completions.create(
+    response = await create_chat_completion(
+        estimate_request_tokens(images),
         model="gpt-4o-mini",
-        messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "You are an AI assistant specialized in analyzing screenshots and generating "
-                        "descriptive filenames for archival purposes. Your task is to examine the provided image, describe its "
-                        "content concisely"
-                    )
-                },
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": "Analyze this image and provide: 1) A concise description of its content"
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/png;base64,{base64_image}"
-                            }
-                        }
-                    ]
-                }
-            ],
-        max_tokens=3000
+        messages=build_messages([image.image_url for image in images]),
+        response_format={"type": "json_object"},
+        max_tokens=MAX_COMPLETION_TOKENS
     )
-    
-    content = response.choices[0].message.content.strip()
-    usage_info = {
-        'prompt_tokens': response.usage.prompt_tokens,
-        'completion_tokens': response.usage.completion_tokens,
-        'total_tokens': response.usage.total_tokens
-    }
-    
-    return content, usage_info
 
+    count = len(images)
+    results = parse_batch_response(response.choices[0].message.content, count)
+    for result in results:
+        if result is not None:
+            result.update({
+                'prompt_tokens': response.usage.prompt_tokens // count,
+                'completion_tokens': response.usage.completion_tokens // count,
+                'total_tokens': response.usage.total_tokens // count
+            })
 
-def get_new_name(image_content: str) ->str:
+    return results
+
+
+def sanitize_filename(name: str) -> str:
     """
-    Use ChatGPT to generate a new name based on the image content.
-    You can tweak the user prompt to be more specific or different tone.
+    Keep only lowercase letters, digits, underscores and dashes so the name is safe on every OS.
     """
-    response = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": "You are a helpful archival assistant that generates descriptive filenames based on image content. You generate descriptive names to \
-             easily understand whats in the file quickly scroll through folders"},
-            {"role": "user", "content": f"Generate a concise filename (without extension) for an image with this content: {image_content}"}
-        ]
-    )
-    return response.choices[0].message.content.strip()
+    clean_name = re.sub(r'[^a-z0-9_\-]', '', name.strip().lower().replace(' ', '_'))
+    if not clean_name:
+        raise ValueError(f"No usable filename in model response: {name!r}")
+    return clean_name
 
-def add_metadata(image_path: str, content: str) -> str:
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+TEXT_CHUNK_TYPES = (b'tEXt', b'zTXt', b'iTXt')
+
+
+def png_chunk(chunk_type: bytes, data: bytes) -> bytes:
     """
-    Add metadata to the image file using Pillow.
+    Build a raw PNG chunk: length, type, data and the CRC32 of type + data.
     """
-    print(content)
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data) & 0xffffffff)
+
+
+def text_chunk(keyword: str, value: str) -> bytes:
+    """
+    tEXt chunks can only hold Latin-1, anything else goes in an uncompressed iTXt (UTF-8) chunk,
+    the same way Pillow's PngInfo.add_text does it.
+    """
+    key = keyword.encode('latin-1')
     try:
-        with Image.open(image_path) as img:
-            metadata = PngInfo()
-            metadata.add_text("Description", content)
-            img.save(image_path, pnginfo=metadata)
-    except Exception as e:
-        print(f"Error adding metadata to {image_path}: {str(e)}")
+        return png_chunk(b'tEXt', key + b'\0' + value.encode('latin-1'))
+    except UnicodeEncodeError:
+        return png_chunk(b'iTXt', key + b'\0\0\0' + b'\0' + b'\0' + value.encode('utf-8'))
+
+
+def add_text_chunk(png_data: bytes, keyword: str, value: str) -> bytes:
+    """
+    Splice a text chunk into PNG bytes without decoding or re-compressing the pixels.
+    Any existing chunk with the same keyword is replaced, every other chunk is copied as-is.
+    The new chunk goes right before the first IDAT rather than before IEND, because Pillow
+    (and so checkmetatags) only reads text chunks that come before the image data into img.info.
+    If the PNG already has exactly this value it's returned unchanged.
+    """
+    if not png_data.startswith(PNG_SIGNATURE):
+        raise ValueError("not a PNG file")
+
+    new_chunk = text_chunk(keyword, value)
+    key_prefix = keyword.encode('latin-1') + b'\0'
+    parts = [PNG_SIGNATURE]
+    inserted = False
+    offset = len(PNG_SIGNATURE)
+    while offset < len(png_data):
+        length, chunk_type = struct.unpack(">I4s", png_data[offset:offset + 8])
+        chunk_end = offset + 12 + length
+        chunk = png_data[offset:chunk_end]
+
+        if chunk_type in TEXT_CHUNK_TYPES and png_data[offset + 8:offset + 8 + len(key_prefix)] == key_prefix:
+            if chunk == new_chunk:
+                return png_data
+        else:
+            if not inserted and chunk_type in (b'IDAT', b'IEND'):
+                parts.append(new_chunk)
+                inserted = True
+            parts.append(chunk)
+
+        offset = chunk_end
+        if chunk_type == b'IEND':
+            break
+
+    return b''.join(parts)
+
+
+def finalize_with_metadata(png_data: bytes, content: str, out_path: str) -> None:
+    """
+    Write the screenshot to out_path with the Description metadata added, in one write.
+    The rest of the file (other text chunks, dpi, icc, exif) stays untouched and there's no Pillow re-encode.
+    It goes to a temp file first and is swapped in with os.replace, so it's never left half written.
+    """
+    temp_path = f"{out_path}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(add_text_chunk(png_data, "Description", content))
+    os.replace(temp_path, out_path)
+
+#list of indicators add what your tool of choice does here
+SCREENSHOT_INDICATORS = ['screenshot', 'screen_shot', 'screenclip', 'capture', 'snip']
+
+# All the indicators compiled into one case insensitive pattern, so checking a file is a single regex search.
+# Whitespace is allowed between the letters ("Screen Shot", "Screen Clip") and the name has to end in .png
+_SCREENSHOT_RE = re.compile(
+    '(?:' + '|'.join(r'\s*'.join(map(re.escape, indicator)) for indicator in SCREENSHOT_INDICATORS) + r').*\.png\s*$',
+    re.IGNORECASE | re.DOTALL
+)
 
 def is_screenshot(filename: str) -> bool:
     """
@@ -139,74 +486,432 @@ def is_screenshot(filename: str) -> bool:
     Returns:
         bool: True if the file is likely a screenshot, false if not
     """
-    # Convert to lowercase and remove all whitespace
-    clean_name = re.sub(r'\s+', '', filename.lower())
-    
-    # Check if it ends with .png
-    if not clean_name.endswith('.png'):
-        return False
-    
-    #list of indicators add what your tool of choice does here
-    screenshot_indicators = ['screenshot', 'screen_shot', 'screenclip', 'capture', 'snip']
-    
-    # Check if any of the indicators are in the cleaned filename
-    return any(indicator in clean_name for indicator in screenshot_indicators)
+    return _SCREENSHOT_RE.search(filename) is not None
+
+def list_screenshots(folder_path: str) -> List[str]:
+    """
+    Names of the screenshot files directly inside the folder.
+    os.scandir hands back the file type with each entry, so there's no extra stat per file.
+    """
+    with os.scandir(folder_path) as entries:
+        return [entry.name for entry in entries if entry.is_file() and is_screenshot(entry.name)]
+
+def claim_new_path(folder_path: str, new_name: str, sha256: str) -> str:
+    """
+    Pick a free path for the renamed screenshot and reserve it by creating it exclusively.
+    If new_name.png is taken it gets the first 8 characters of the file's hash appended,
+    and a counter on top of that for identical copies, so nothing already there is ever overwritten.
+    O_EXCL makes the check-and-create atomic, so concurrent workers can't grab the same name.
+    """
+    suffixes = itertools.chain(["", f"_{sha256[:8]}"], (f"_{sha256[:8]}_{count}" for count in itertools.count(2)))
+    for suffix in suffixes:
+        new_file_path = os.path.join(folder_path, f"{new_name}{suffix}.png")
+        try:
+            os.close(os.open(new_file_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return new_file_path
+        except FileExistsError:
+            continue
+
+def move_with_metadata(file_path: str, new_name: str, content: str, png_data: bytes, sha256: str) -> str:
+    """
+    Write the tagged screenshot under a free variant of new_name and remove the original.
+    Returns the path it was written to.
+    """
+    folder_path = os.path.dirname(file_path)
+    new_file_path = claim_new_path(folder_path, new_name, sha256)
+    try:
+        finalize_with_metadata(png_data, content, new_file_path)
+    except Exception:
+        os.remove(new_file_path)
+        raise
+    os.remove(file_path)
+    return new_file_path
+
+async def save_screenshot(file_path: str, result: dict, png_data: bytes, sha256: str) -> dict:
+    """
+    Tag and rename a single screenshot once its description has come back.
+    The tagged PNG is written straight to its new name from the bytes already read, then the original is removed.
+    A name that's already taken gets a suffix from the file's hash instead of being overwritten.
+    The file work runs in a thread so it doesn't block the other in-flight API calls.
+    """
+    filename = os.path.basename(file_path)
+    content = result['description']
+    print(content)
 
-def process_screenshots(folder_path: str, resize_for_api: bool = False) -> list:
-    processed_files = []
-    for filename in os.listdir(folder_path):
-        if is_screenshot(filename):
+    new_file_path = await asyncio.to_thread(move_with_metadata, file_path, result['filename'], content, png_data, sha256)
+    new_filename = os.path.basename(new_file_path)
+
+    print(f"Processed: {filename} -> {new_filename}")
+    return {
+        'original_path': file_path,
+        'new_name': new_filename,
+        'description': content,
+        'prompt_tokens': result['prompt_tokens'],
+        'total_tokens': result['total_tokens']
+    }
+
+async def process_screenshots(folder_path: str, writer: csv.DictWriter, resize_for_api: bool = False,
+                              cache_path: str = CACHE_PATH) -> int:
+    """
+    Process every screenshot in the folder as a three stage pipeline joined by queues:
+        encode (ENCODE_WORKERS) -> batch (1) -> OpenAI (MAX_CONCURRENCY) -> write (WRITE_WORKERS)
+    Every stage is busy with different screenshots at the same time, so the Pillow/base64 work
+    overlaps the network waits instead of every task hitting the same stage at once.
+    The batch stage groups the encoded images into requests of BATCH_SIZE, so only the
+    last request can come up short, and the API workers just send what they're handed.
+    A None on a queue tells that stage's worker there's nothing more coming.
+
+    Each finished screenshot is written to the CSV writer straight away.
+    Returns how many screenshots were processed.
+
+    The encode stage hashes each file first. Anything already in the DescriptionCache skips
+    straight to the write stage, and a copy of a screenshot that's still being worked on in
+    this run waits for that one's answer instead of sending its own request.
+    Every queue after encode is bounded, so only a few screenshots' bytes are in memory at a time.
+    """
+    cache = DescriptionCache(cache_path)
+    to_encode = asyncio.Queue()
+    to_api = asyncio.Queue(maxsize=MAX_CONCURRENCY * BATCH_SIZE * 2)  # caps how many encoded images sit in memory
+    to_send = asyncio.Queue(maxsize=MAX_CONCURRENCY * 2)  # full batches waiting for a free API worker
+    to_write = asyncio.Queue(maxsize=WRITE_WORKERS * BATCH_SIZE * 2)  # cache hits come in faster than they're written
+    in_flight = {}  # sha256 -> Future with the result for that content
+    duplicates = []
+    processed_count = 0
+
+    async def wait_for_duplicate(file_path: str, sha256: str):
+        # only the path is held while waiting, the write stage reads the copy again when it's due
+        result = await in_flight[sha256]
+        if result is None:
+            print(f"Error processing {os.path.basename(file_path)}: the identical screenshot it's a copy of failed")
+            return
+        await to_write.put((file_path, sha256, dict(result, prompt_tokens=0, completion_tokens=0, total_tokens=0), None))
+
+    async def encode_worker():
+        while (filename := await to_encode.get()) is not None:
             file_path = os.path.join(folder_path, filename)
-            
             try:
-                content, usage_info = get_image_content(file_path, resize=resize_for_api)
-                new_name = get_new_name(content)
-                add_metadata(file_path, content)
-                new_file_path = os.path.join(folder_path, f"{new_name}.png")
-                os.rename(file_path, new_file_path)
-                
-                processed_files.append({
-                    'original_path': file_path,
-                    'new_name': f"{new_name}.png",
-                    'description': content,
-                    'prompt_tokens': usage_info['prompt_tokens'],
-                    'total_tokens': usage_info['total_tokens']
-                })
-                
-                print(f"Processed: {filename} -> {new_name}.png")
+                png_data, sha256 = await asyncio.to_thread(read_screenshot, file_path)
+                png_dimensions(png_data)
+            except Exception as e:
+                print(f"Error processing {filename}: {str(e)}")
+                continue
+
+            if sha256 in in_flight:
+                duplicates.append(asyncio.create_task(wait_for_duplicate(file_path, sha256)))
+                continue
+            cached = cache.get(sha256)
+            if cached is not None:
+                await to_write.put((file_path, sha256, cached, png_data))
+                continue
+
+            in_flight[sha256] = asyncio.get_running_loop().create_future()
+            try:
+                image = await asyncio.to_thread(prepare_image, file_path, resize_for_api, png_data)
+            except Exception as e:
+                print(f"Error processing {filename}: {str(e)}")
+                in_flight[sha256].set_result(None)
+                continue
+            await to_api.put((file_path, sha256, image))
+
+    async def batch_worker():
+        # a single worker groups the images, so every request gets a full BATCH_SIZE
+        # no matter how the encode workers finish
+        batch = []
+        while (item := await to_api.get()) is not None:
+            batch.append(item)
+            if len(batch) == BATCH_SIZE:
+                await to_send.put(batch)
+                batch = []
+        if batch:
+            await to_send.put(batch)
+        for _ in range(MAX_CONCURRENCY):
+            await to_send.put(None)
+
+    async def api_worker():
+        while (batch := await to_send.get()) is not None:
+            try:
+                results = await get_batch_content([image for _, _, image in batch])
+            except Exception as e:
+                results = [None] * len(batch)
+                for file_path, _, _ in batch:
+                    print(f"Error processing {os.path.basename(file_path)}: {str(e)}")
+            for (file_path, sha256, image), result in zip(batch, results):
+                in_flight[sha256].set_result(result)
+                if result is not None:
+                    cache.put(sha256, result)
+                await to_write.put((file_path, sha256, result, image.png_data))
+
+    async def write_worker():
+        nonlocal processed_count
+        while (item := await to_write.get()) is not None:
+            file_path, sha256, result, png_data = item
+            filename = os.path.basename(file_path)
+            if result is None:
+                print(f"Error processing {filename}: no result in model response")
+                continue
+            try:
+                if png_data is None:
+                    png_data, current_sha256 = await asyncio.to_thread(read_screenshot, file_path)
+                    if current_sha256 != sha256:
+                        raise ValueError("file changed while it was waiting on its identical copy")
+                writer.writerow(await save_screenshot(file_path, result, png_data, sha256))
+                processed_count += 1
             except Exception as e:
                 print(f"Error processing {filename}: {str(e)}")
+
+    async def encode_stage():
+        await asyncio.gather(*(encode_worker() for _ in range(ENCODE_WORKERS)))
+        await to_api.put(None)
+
+    async def api_stage():
+        await asyncio.gather(*(api_worker() for _ in range(MAX_CONCURRENCY)))
+        # every duplicate was found by the encode stage, so they're all known by now
+        await asyncio.gather(*duplicates)
+        for _ in range(WRITE_WORKERS):
+            await to_write.put(None)
+
+    for filename in list_screenshots(folder_path):
+        to_encode.put_nowait(filename)
+    for _ in range(ENCODE_WORKERS):
+        to_encode.put_nowait(None)
+
+    try:
+        await asyncio.gather(
+            encode_stage(),
+            batch_worker(),
+            api_stage(),
+            *(write_worker() for _ in range(WRITE_WORKERS))
+        )
+    finally:
+        cache.close()
     
-    return processed_files
+    return processed_count
+
+@retry_openai
+async def upload_batch_file(requests_filename: str):
+    """
+    Upload the batch's JSONL file. It's reopened on every attempt so a retry sends it from the start.
+    """
+    with open(requests_filename, 'rb') as requests_file:
+        return await client.files.create(file=requests_file, purpose="batch")
+
+@retry_openai
+async def create_batch(input_file_id: str):
+    return await client.batches.create(
+        input_file_id=input_file_id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+
+@retry_openai
+async def retrieve_batch(batch_id: str):
+    return await client.batches.retrieve(batch_id)
+
+@retry_openai
+async def download_file(file_id: str):
+    return await client.files.content(file_id)
+
+async def submit_batch(folder_path: str, output_folder: str, filenames: List[str], resize_for_api: bool = False):
+    """
+    Write one Batch API request per screenshot in filenames to a JSONL file, upload it and start the batch job.
+    Batch jobs come back within 24h at roughly half the price, and don't count against your RPM limit,
+    so this is the way to go for big archival runs where you don't need the answers right away.
+    The custom_id of every request is the screenshot's filename so the results can be matched back up.
+    A file that can't be encoded is reported and left out, and if none can be there's no batch (returns None).
+    """
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    requests_filename = os.path.join(output_folder, f"batch_requests_{timestamp}.jsonl")
+
+    request_count = 0
+    with open(requests_filename, 'w') as requests_file:
+        for filename in filenames:
+            try:
+                image_url = await asyncio.to_thread(encode_image, os.path.join(folder_path, filename), resize_for_api)
+            except Exception as e:
+                print(f"Error processing {filename}: {str(e)}")
+                continue
+            request = {
+                "custom_id": filename,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": "gpt-4o-mini",
+                    "messages": build_messages([image_url]),
+                    "response_format": {"type": "json_object"},
+                    "max_tokens": MAX_COMPLETION_TOKENS
+                }
+            }
+            requests_file.write(json.dumps(request) + "\n")
+            request_count += 1
+
+    if not request_count:
+        print("No screenshots could be encoded, nothing to submit")
+        return None
+
+    batch_file = await upload_batch_file(requests_filename)
+    batch = await create_batch(batch_file.id)
+
+    print(f"Submitted batch {batch.id} with {request_count} screenshots ({requests_filename})")
+    print(f"If this run gets interrupted, pick the batch back up with: python app.py --resume-batch {batch.id}")
+    return batch
+
+async def wait_for_batch(batch_id: str):
+    """
+    Poll the Batch API until the job is finished one way or another.
+    """
+    while True:
+        batch = await retrieve_batch(batch_id)
+        if batch.status in BATCH_DONE_STATUSES:
+            return batch
+        counts = batch.request_counts
+        print(f"Batch {batch_id} is {batch.status} ({counts.completed}/{counts.total} done), checking again in {BATCH_POLL_INTERVAL}s")
+        await asyncio.sleep(BATCH_POLL_INTERVAL)
+
+async def apply_batch_results(folder_path: str, batch, cache: DescriptionCache, writer: csv.DictWriter) -> int:
+    """
+    Download the output of a finished batch and tag + rename every screenshot it has an answer for.
+    Every answer also goes into the description cache, and each screenshot to the CSV as it's done.
+    Returns how many screenshots were processed.
+    """
+    if batch.status != "completed":
+        print(f"Batch {batch.id} ended with status {batch.status}, nothing to apply")
+        return 0
+    if batch.request_counts.failed:
+        print(f"{batch.request_counts.failed} requests in batch {batch.id} failed, see error file {batch.error_file_id}")
+    if not batch.output_file_id:
+        return 0
+
+    output = await download_file(batch.output_file_id)
+
+    processed_count = 0
+    for line in output.text.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        filename = record["custom_id"]
+        try:
+            response = record.get("response") or {}
+            if record.get("error") or response.get("status_code") != 200:
+                raise RuntimeError(record.get("error") or response.get("body"))
+            body = response["body"]
+            result = parse_batch_response(body["choices"][0]["message"]["content"], 1)[0]
+            if result is None:
+                raise ValueError("no result in model response")
+            result.update({
+                'prompt_tokens': body["usage"]["prompt_tokens"],
+                'completion_tokens': body["usage"]["completion_tokens"],
+                'total_tokens': body["usage"]["total_tokens"]
+            })
+            file_path = os.path.join(folder_path, filename)
+            png_data, sha256 = await asyncio.to_thread(read_screenshot, file_path)
+            cache.put(sha256, result)
+            writer.writerow(await save_screenshot(file_path, result, png_data, sha256))
+            processed_count += 1
+        except Exception as e:
+            print(f"Error processing {filename}: {str(e)}")
+
+    return processed_count
+
+async def process_screenshots_batch(folder_path: str, output_folder: str, writer: csv.DictWriter,
+                                    resize_for_api: bool = False, batch_id: Optional[str] = None,
+                                    cache_path: str = CACHE_PATH) -> int:
+    """
+    Run the whole folder through the OpenAI Batch API: submit, wait, then apply the results locally.
+    Screenshots already in the description cache are renamed right away and left out of the batch.
+    Pass the batch_id of a batch that was already submitted to skip straight to waiting on it,
+    so an interrupted run doesn't have to pay for the whole folder again.
+    """
+    cache = DescriptionCache(cache_path)
+    try:
+        if batch_id is not None:
+            batch = await wait_for_batch(batch_id)
+            return await apply_batch_results(folder_path, batch, cache, writer)
+
+        processed_count = 0
+        pending = []
+        for filename in list_screenshots(folder_path):
+            file_path = os.path.join(folder_path, filename)
+            try:
+                png_data, sha256 = await asyncio.to_thread(read_screenshot, file_path)
+                cached = cache.get(sha256)
+                if cached is None:
+                    pending.append(filename)
+                else:
+                    writer.writerow(await save_screenshot(file_path, cached, png_data, sha256))
+                    processed_count += 1
+            except Exception as e:
+                print(f"Error processing {filename}: {str(e)}")
+
+        if not pending:
+            return processed_count
+        batch = await submit_batch(folder_path, output_folder, pending, resize_for_api=resize_for_api)
+        if batch is None:
+            return processed_count
+        batch = await wait_for_batch(batch.id)
+        processed_count += await apply_batch_results(folder_path, batch, cache, writer)
+        return processed_count
+    finally:
+        cache.close()
+
+CSV_FIELDNAMES = ['original_path', 'new_name', 'description', 'prompt_tokens', 'total_tokens']
 
 """
 Tracking what the old name was, the new name, the content, and the tokens used from openAI
+The file is line buffered, so every row is flushed as soon as its screenshot is done:
+nothing piles up in memory, and if a run dies the CSV shows how far it got.
+Rows are only written from the event loop thread, so the concurrent workers can't interleave them.
 """
-def write_to_csv(processed_files: list, output_folder: str) -> None:
+def open_csv(output_folder: str):
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     csv_filename = os.path.join(output_folder, f"processed_files_{timestamp}.csv")
     
-    with open(csv_filename, 'w', newline='') as csvfile:
-        fieldnames = ['original_path', 'new_name', 'description', 'prompt_tokens', 'total_tokens']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        
-        writer.writeheader()
-        for file in processed_files:
-            writer.writerow(file)
+    csvfile = open(csv_filename, 'w', newline='', encoding='utf-8', buffering=1)
+    writer = csv.DictWriter(csvfile, fieldnames=CSV_FIELDNAMES)
+    writer.writeheader()
     
-    print(f"CSV file created: {csv_filename}")         
+    print(f"CSV file created: {csv_filename}")
+    return csvfile, writer
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Rename and tag screenshots based on their content.")
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Use the OpenAI Batch API (about half the cost, results within 24h) instead of live requests"
+    )
+    parser.add_argument(
+        "--resume-batch",
+        metavar="BATCH_ID",
+        help="Wait for and apply a batch that was already submitted instead of submitting a new one"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help=f"Don't reuse or save descriptions in the cache ({CACHE_PATH}), every screenshot is sent to OpenAI"
+    )
+    args = parser.parse_args()
+
     folder_path = "/Users/topherjaynes/Desktop/screenshot/testshots"
     output_folder = "/Users/topherjaynes/Desktop/screenshot/output"
     resize_for_api = True  # Set this to False if you don't want to resize images for API
+    cache_path = NO_CACHE_PATH if args.no_cache else CACHE_PATH
     
     # Ensure output folder exists
     os.makedirs(output_folder, exist_ok=True)
     
-    processed_files = process_screenshots(folder_path, resize_for_api=resize_for_api)
-    write_to_csv(processed_files, output_folder)
+    csvfile, writer = open_csv(output_folder)
+    with csvfile:
+        if args.batch or args.resume_batch:
+            processed_count = asyncio.run(process_screenshots_batch(
+                folder_path, output_folder, writer, resize_for_api=resize_for_api, batch_id=args.resume_batch,
+                cache_path=cache_path
+            ))
+        else:
+            processed_count = asyncio.run(process_screenshots(
+                folder_path, writer, resize_for_api=resize_for_api, cache_path=cache_path
+            ))
+    print(f"Processed {processed_count} screenshots, see {csvfile.name}")
 
 if __name__ == "__main__":
     main()
@@ -1,7 +1,8 @@
 import os
 import platform
-import math
 import csv
+from collections import namedtuple
+import numpy as np  # Ensure NumPy is installed: pip install numpy
 from PIL import Image  # Ensure Pillow is installed: pip install Pillow
 
 """
@@ -22,6 +23,54 @@ PRICE_PER_MILLION_TOKENS = 0.15
 BASE_TOKENS_PER_IMAGE = 2833
 TILE_TOKENS = 5667
 TILE_SIZE_PIXELS = 512  # 512x512 tiles
+MAX_IMAGE_SIZE_PIXELS = 2048  # images are scaled to fit inside 2048x2048 first
+SHORT_SIDE_PIXELS = 768  # then so the shortest side is 768
+
+# Everything we need from a PNG, read in a single Image.open
+PngMeta = namedtuple('PngMeta', ['width', 'height', 'description', 'size_bytes'])
+
+def read_png_meta(file_path, size_bytes=None):
+    """
+    Reads the dimensions, Description tag and file size of a PNG in one pass.
+    Image.open only parses the headers, so this never decodes the pixels.
+
+    Args:
+        file_path (str): Path to the PNG file.
+        size_bytes (int, optional): File size if the caller already has it (e.g. from os.scandir).
+
+    Returns:
+        PngMeta: The width, height, description (or None) and size in bytes.
+    """
+    with Image.open(file_path) as img:
+        width, height = img.size
+        description = img.info.get("Description")
+    if size_bytes is None:
+        size_bytes = os.path.getsize(file_path)
+    return PngMeta(width, height, description, size_bytes)
+
+def scan_files(directory):
+    """
+    Recursively yields every file under directory using os.scandir.
+    Each DirEntry already knows its file type from the directory listing, so telling
+    files from folders needs no extra stat the way os.walk's isdir checks can.
+    entry.stat() (for the size) is still one stat call per file on macOS and Linux,
+    it's only free on Windows.
+
+    Args:
+        directory (str): The directory path to scan.
+
+    Yields:
+        os.DirEntry: One entry per file.
+    """
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    yield from scan_files(entry.path)
+                elif entry.is_file():
+                    yield entry
+    except OSError as e:
+        print(f"Error scanning directory {directory}: {e}")
 
 def analyze_screenshot_pngs(directory):
     """
@@ -34,25 +83,23 @@ def analyze_screenshot_pngs(directory):
         list of dict: A list containing information about each screenshot.
     """
     screenshot_data = []
-    for root, dirs, files in os.walk(directory):
-        for file in files:
-            if file.lower().endswith('.png'):
-                name_without_extension = os.path.splitext(file)[0].lower()
-                if 'screenshot' in name_without_extension or 'screen shot' in name_without_extension:
-                    file_path = os.path.join(root, file)
-                    try:
-                        with Image.open(file_path) as img:
-                            width, height = img.size
-                    except Exception as e:
-                        print(f"Error opening image {file_path}: {e}")
-                        continue
-                    size_bytes = os.path.getsize(file_path)
-                    screenshot_data.append({
-                        'file_path': file_path,
-                        'width_px': width,
-                        'height_px': height,
-                        'size_bytes': size_bytes
-                    })
+    for entry in scan_files(directory):
+        if entry.name.lower().endswith('.png'):
+            name_without_extension = os.path.splitext(entry.name)[0].lower()
+            if 'screenshot' in name_without_extension or 'screen shot' in name_without_extension:
+                file_path = entry.path
+                try:
+                    meta = read_png_meta(file_path, entry.stat().st_size)
+                except Exception as e:
+                    print(f"Error opening image {file_path}: {e}")
+                    continue
+                screenshot_data.append({
+                    'file_path': file_path,
+                    'width_px': meta.width,
+                    'height_px': meta.height,
+                    'description': meta.description,
+                    'size_bytes': meta.size_bytes
+                })
     return screenshot_data
 
 def get_desktop_path():
@@ -73,20 +120,44 @@ def get_desktop_path():
     else:
         raise OSError(f"Unsupported operating system: {system}")
 
-def determine_tiles(width, height, tile_size=TILE_SIZE_PIXELS):
+def scale_for_vision(width, height, max_size=MAX_IMAGE_SIZE_PIXELS, short_side=SHORT_SIDE_PIXELS):
     """
-    Determines the number of 512x512 tiles needed for an image.
+    Scales an image's dimensions the way OpenAI does before tiling a high detail image:
+    first to fit inside max_size x max_size, then so the shortest side is short_side.
+    Images that are already small enough are left as-is.
 
     Args:
         width (int): Image width in pixels.
         height (int): Image height in pixels.
+        max_size (int, optional): Longest side allowed. Defaults to 2048.
+        short_side (int, optional): Target for the shortest side. Defaults to 768.
+
+    Returns:
+        tuple: The (width, height) the image is actually tiled at.
+    """
+    if max(width, height) > max_size:
+        scale = max_size / max(width, height)
+        width, height = int(width * scale), int(height * scale)
+    if min(width, height) > short_side:
+        scale = short_side / min(width, height)
+        width, height = int(width * scale), int(height * scale)
+    return width, height
+
+def determine_tiles(width, height, tile_size=TILE_SIZE_PIXELS):
+    """
+    Determines the number of 512x512 tiles needed for an image.
+    Uses integer ceiling division, so it works the same on plain ints and on NumPy arrays of sizes.
+
+    Args:
+        width (int or np.ndarray): Image width in pixels.
+        height (int or np.ndarray): Image height in pixels.
         tile_size (int, optional): Size of each tile in pixels. Defaults to 512.
 
     Returns:
-        int: Number of tiles required.
+        int or np.ndarray: Number of tiles required.
     """
-    tiles_x = math.ceil(width / tile_size)
-    tiles_y = math.ceil(height / tile_size)
+    tiles_x = -(-width // tile_size)
+    tiles_y = -(-height // tile_size)
     return tiles_x * tiles_y
 
 def calculate_tokens_per_image(tiles):
@@ -157,6 +228,19 @@ def generate_csv_report(screenshot_data, output_path='screenshot_analysis.csv'):
             ])
     print(f"CSV report generated at: {output_path}")
 
+# Fields estimate_costs_and_savings adds to each screenshot's dictionary
+ESTIMATE_FIELDS = (
+    'original_tiles',
+    'original_tokens',
+    'original_cost',
+    'halved_width_px',
+    'halved_height_px',
+    'halved_tiles',
+    'halved_tokens',
+    'halved_cost',
+    'savings'
+)
+
 def estimate_costs_and_savings(screenshot_data):
     """
     Estimates costs for original and halved image sizes and calculates savings.
@@ -167,42 +251,41 @@ def estimate_costs_and_savings(screenshot_data):
     Returns:
         tuple: Total original cost, total halved cost, total savings.
     """
-    total_original_cost = 0
-    total_halved_cost = 0
-
-    for data in screenshot_data:
-        # Original image calculations
-        original_tiles = determine_tiles(data['width_px'], data['height_px'])
-        original_tokens = calculate_tokens_per_image(original_tiles)
-        original_cost = calculate_cost(original_tokens)
-
-        # Halved image calculations
-        halved_width = max(1, data['width_px'] // 2)  # Avoid zero dimension
-        halved_height = max(1, data['height_px'] // 2)
-        halved_tiles = determine_tiles(halved_width, halved_height)
-        halved_tokens = calculate_tokens_per_image(halved_tiles)
-        halved_cost = calculate_cost(halved_tokens)
-
-        # Savings calculation
-        savings = original_cost - halved_cost
-
-        # Update totals
-        total_original_cost += original_cost
-        total_halved_cost += halved_cost
-
-        # Update data dictionary with new fields
-        data.update({
-            'original_tiles': original_tiles,
-            'original_tokens': original_tokens,
-            'original_cost': original_cost,
-            'halved_width_px': halved_width,
-            'halved_height_px': halved_height,
-            'halved_tiles': halved_tiles,
-            'halved_tokens': halved_tokens,
-            'halved_cost': halved_cost,
-            'savings': savings
-        })
-
+    if not screenshot_data:
+        return 0, 0, 0
+
+    # Do the math for every screenshot at once on arrays instead of one at a time
+    count = len(screenshot_data)
+    widths = np.fromiter((data['width_px'] for data in screenshot_data), dtype=np.int64, count=count)
+    heights = np.fromiter((data['height_px'] for data in screenshot_data), dtype=np.int64, count=count)
+
+    # Original image calculations
+    original_tiles = determine_tiles(widths, heights)
+    original_tokens = calculate_tokens_per_image(original_tiles)
+    original_cost = calculate_cost(original_tokens)
+
+    # Halved image calculations
+    halved_widths = np.maximum(1, widths // 2)  # Avoid zero dimension
+    halved_heights = np.maximum(1, heights // 2)
+    halved_tiles = determine_tiles(halved_widths, halved_heights)
+    halved_tokens = calculate_tokens_per_image(halved_tiles)
+    halved_cost = calculate_cost(halved_tokens)
+
+    # Savings calculation
+    savings = original_cost - halved_cost
+
+    # Update data dictionaries with new fields, tolist() hands back plain Python numbers
+    for data, *values in zip(
+        screenshot_data,
+        original_tiles.tolist(), original_tokens.tolist(), original_cost.tolist(),
+        halved_widths.tolist(), halved_heights.tolist(),
+        halved_tiles.tolist(), halved_tokens.tolist(), halved_cost.tolist(),
+        savings.tolist()
+    ):
+        data.update(zip(ESTIMATE_FIELDS, values))
+
+    total_original_cost = float(original_cost.sum())
+    total_halved_cost = float(halved_cost.sum())
     total_savings = total_original_cost - total_halved_cost
     return total_original_cost, total_halved_cost, total_savings
 
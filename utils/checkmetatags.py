@@ -1,5 +1,46 @@
 import os
-from PIL import Image
+import zlib
+import struct
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+def iter_text_chunks(path: str) -> dict:
+    """
+    Read just the text chunks (tEXt, zTXt, iTXt) of a PNG by walking the chunk headers.
+    Everything else, including the image data, is skipped with a seek so nothing gets decoded.
+    Returns a {keyword: value} dict.
+    """
+    text = {}
+    with open(path, 'rb') as f:
+        if f.read(8) != PNG_SIGNATURE:
+            return text
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                break
+            length, chunk_type = struct.unpack(">I4s", header)
+            if chunk_type == b'IEND':
+                break
+            if chunk_type not in (b'tEXt', b'zTXt', b'iTXt'):
+                f.seek(length + 4, os.SEEK_CUR)  # skip the data and the CRC
+                continue
+
+            data = f.read(length)
+            f.seek(4, os.SEEK_CUR)  # CRC
+            keyword, _, value = data.partition(b'\0')
+            if chunk_type == b'tEXt':
+                text[keyword.decode('latin-1')] = value.decode('latin-1')
+            elif chunk_type == b'zTXt':
+                # first byte is the compression method, always zlib
+                text[keyword.decode('latin-1')] = zlib.decompress(value[1:]).decode('latin-1')
+            else:
+                compressed = value[0]
+                # skip the compression method, language tag and translated keyword
+                value = value[2:].split(b'\0', 2)[2]
+                if compressed:
+                    value = zlib.decompress(value)
+                text[keyword.decode('latin-1')] = value.decode('utf-8')
+    return text
 
 def read_metadata_from_folder(folder_path: str):
     """
@@ -7,13 +48,12 @@ def read_metadata_from_folder(folder_path: str):
     Prints the image name and metadata description to the terminal.
     """
     try:
-        for filename in os.listdir(folder_path):
-            if filename.lower().endswith('.png'):
-                file_path = os.path.join(folder_path, filename)
-                with Image.open(file_path) as img:
-                    metadata = img.info
+        with os.scandir(folder_path) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.lower().endswith('.png'):
+                    metadata = iter_text_chunks(entry.path)
                     description = metadata.get("Description", "No description found")
-                    print(f"Image: {filename}\nDescription: {description}\n")
+                    print(f"Image: {entry.name}\nDescription: {description}\n")
 
     except Exception as e:
         print(f"Error reading metadata from images: {str(e)}")